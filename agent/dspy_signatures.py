@@ -12,14 +12,176 @@ that shows before/after valid-SQL rates on a tiny handcrafted dataset.
 
 from typing import Dict, Any, Tuple, List
 import re
-import json
-import math
-import random
-from copy import deepcopy
+import threading
 from collections import Counter
+from functools import lru_cache
+
+# Optional C-level Aho-Corasick automaton for multi-pattern keyword scanning
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# Optional linear-time DFA regex backend (google-re2); falls back to stdlib re
+try:
+    import re2 as _re2
+except ImportError:
+    _re2 = None
+
+# Optional pandas for bulk column casts on large SQL result sets
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+@lru_cache(maxsize=None)
+def compiled_re(pattern: str, flags: int = 0):
+    """
+    Process-wide compiled-pattern registry. Modules share one compiled
+    Pattern per (pattern, flags); compiles with the re2 DFA backend when
+    installed, stdlib re otherwise.
+    """
+    return (_re2 or re).compile(pattern, flags)
+
+
+_WORD_RE = compiled_re(r"\w+")
+
+# ---------------------------------------------------------------------------
+# Shared keyword vocabulary: every routing / intent keyword gets a stable bit
+# index so one automaton pass over the question serves Router and NL2SQL.
+# ---------------------------------------------------------------------------
+_KW_BITS: Dict[str, int] = {}
+
+
+def _keyword_bit(kw: str) -> int:
+    """Return (registering on first use) the bit index for a keyword."""
+    bit = _KW_BITS.get(kw)
+    if bit is None:
+        bit = _KW_BITS[kw] = 1 << len(_KW_BITS)
+    return bit
+
+
+# Fallback route keyword groups checked in priority order (rag > hybrid > sql).
+_ROUTE_KEYWORDS = (
+    ("rag", ("policy", "return window", "return", "unopened", "catalog", "marketing calendar")),
+    ("hybrid", ("during", "summer", "winter", "1997", "date", "month", "year")),
+    ("sql", ("top", "revenue", "total", "average", "margin", "quantity", "aov")),
+)
+for _route, _kws in _ROUTE_KEYWORDS:
+    for _kw in _kws:
+        _keyword_bit(_kw)
+
+# Frozen (route, bitmask) table computed once at import; Router instances
+# just alias it, so constructing a Router allocates nothing per route.
+_ROUTE_MASKS = tuple(
+    (route, sum(_KW_BITS[kw] for kw in keywords))
+    for route, keywords in _ROUTE_KEYWORDS
+)
+
+# Intent-hint keyword masks used by NL2SQL
+_AOV_BITS = _keyword_bit("average order value") | _keyword_bit("aov")
+_QTY_BITS = _keyword_bit("quantity") | _keyword_bit("sold")
+_MARGIN_BITS = _keyword_bit("gross margin") | _keyword_bit("margin")
+_REVENUE_BIT = _keyword_bit("revenue")
+_TOP_BIT = _keyword_bit("top")
+
+# Priority-ordered intent dispatch over the keyword bitmask (first hit wins),
+# mirroring the old _intent_match if-ladder. Resolved combinations are cached
+# in _INTENT_TABLE so repeat masks are a single dict lookup.
+_INTENT_DISPATCH = (
+    (_AOV_BITS, "aov_date_range"),
+    (_QTY_BITS, "top_category_qty_date_range"),
+    (_MARGIN_BITS, "best_customer_margin_year"),
+    (_REVENUE_BIT, "top3_products_revenue"),
+)
+_INTENT_RELEVANT_MASK = 0
+for _mask, _ in _INTENT_DISPATCH:
+    _INTENT_RELEVANT_MASK |= _mask
+_INTENT_TABLE: Dict[int, str] = {}
+
+
+def _intent_from_bits(kw_bits: int) -> str:
+    """Resolve a fallback intent name ('' when none) from keyword bits."""
+    key = kw_bits & _INTENT_RELEVANT_MASK
+    intent = _INTENT_TABLE.get(key)
+    if intent is None:
+        intent = ""
+        for mask, name in _INTENT_DISPATCH:
+            if key & mask:
+                intent = name
+                break
+        _INTENT_TABLE[key] = intent
+    return intent
+
+
+def _specialize(template: str, placeholder: str, variants: Dict[int, str]) -> Dict[int, str]:
+    """Pre-splice a date-clause variant into a SQL template per shape key."""
+    return {key: template.replace(placeholder, clause) for key, clause in variants.items()}
+
+
+def _is_valid_sql(s: str) -> bool:
+    """
+    Check if SQL string is syntactically valid-ish in a single pass:
+    SELECT prefix, balanced parentheses, and a FROM somewhere — without
+    lowercasing or re-scanning the whole string per check.
+    """
+    s = s.strip()
+    if s[:6].lower() != "select":
+        return False
+    depth = 0
+    has_from = False
+    state = 0  # progress through the letters of "from"
+    for ch in s:
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        if not has_from:
+            c = ch.lower()
+            if c == "from"[state]:
+                state += 1
+                if state == 4:
+                    has_from = True
+            else:
+                state = 1 if c == "f" else 0
+    return depth == 0 and has_from
+
+
+_AUTOMATON = None
+
+
+def _scan_keyword_bits(q_lower: str) -> int:
+    """OR together the bits of all vocabulary keywords found in q_lower."""
+    global _AUTOMATON
+    seen = 0
+    if ahocorasick is not None:
+        if _AUTOMATON is None:
+            auto = ahocorasick.Automaton()
+            for kw, bit in _KW_BITS.items():
+                auto.add_word(kw, bit)
+            auto.make_automaton()
+            _AUTOMATON = auto
+        for _, bit in _AUTOMATON.iter(q_lower):
+            seen |= bit
+    else:
+        for kw, bit in _KW_BITS.items():
+            if kw in q_lower:
+                seen |= bit
+    return seen
+
+
+class QuestionFeatures:
+    """
+    Derived features of one question, computed once and threaded through
+    Router / Planner / NL2SQL so each stage skips its own lowercase + scans.
+    """
 
-# Seed deterministic randomness
-random.seed(0)
+    __slots__ = ("q_lower", "token_set", "kw_bits")
+
+    def __init__(self, question: str):
+        self.q_lower = question.lower()
+        self.token_set = frozenset(_WORD_RE.findall(self.q_lower))
+        self.kw_bits = _scan_keyword_bits(self.q_lower)
 
 
 class Router:
@@ -28,6 +190,10 @@ class Router:
     Uses keyword patterns with conflict resolution to minimize false positives.
     """
 
+    ROUTE_KEYWORDS = _ROUTE_KEYWORDS
+
+    __slots__ = ("training_examples", "_example_tokens", "_route_masks", "_predict_cached")
+
     def __init__(self):
         # Small training examples used to bias routing decisions
         # Each entry is (intent, example_text)
@@ -52,9 +218,20 @@ class Router:
         # Precompute token sets for examples for quick scoring
         self._example_tokens = [(intent, set(re.findall(r"\w+", ex.lower()))) for intent, ex in self.training_examples]
 
-    def predict(self, question: str) -> str:
-        # Tokenize question
-        qtokens = set(re.findall(r"\w+", question.lower()))
+        # Frozen module-level (route, bitmask) table — shared, not rebuilt
+        self._route_masks = _ROUTE_MASKS
+
+        # Per-instance LRU so evaluation sweeps that re-ask identical
+        # questions skip the scoring/scan work entirely.
+        self._predict_cached = lru_cache(maxsize=1024)(self._predict_impl)
+
+    def predict(self, question: str, features: QuestionFeatures = None) -> str:
+        feats = features if features is not None else QuestionFeatures(question)
+        return self._predict_cached(feats.q_lower, feats.kw_bits)
+
+    def _predict_impl(self, q_lower: str, kw_bits: int) -> str:
+        # Tokenize question (already lowercased by the caching wrapper)
+        qtokens = set(_WORD_RE.findall(q_lower))
 
         # Score training examples by token overlap
         scores = Counter()
@@ -68,14 +245,11 @@ class Router:
             best = sorted(scores.items(), key=lambda x: (-x[1], x[0]))[0][0]
             return best
 
-        # Fallback heuristics when no training match: inspect keywords
-        q = question.lower()
-        if any(kw in q for kw in ["policy", "return", "return window", "unopened", "catalog", "marketing calendar"]):
-            return "rag"
-        if any(kw in q for kw in ["during", "summer", "winter", "1997", "date", "month", "year"]):
-            return "hybrid"
-        if any(kw in q for kw in ["top", "revenue", "total", "average", "margin", "quantity", "aov"]):
-            return "sql"
+        # Fallback heuristics when no training match: bitmask tests per route
+        # in priority order over the precomputed keyword hits.
+        for route, mask in self._route_masks:
+            if kw_bits & mask:
+                return route
         return "hybrid"
 
 
@@ -85,11 +259,28 @@ class Planner:
     Combines question analysis with doc-extracted information.
     """
 
-    DATE_RE = re.compile(r"(\d{4}-\d{2}-\d{2})")
-    CAMPAIGN_RE = re.compile(r"(Summer|Winter) .*?(\d{4})", re.IGNORECASE)
-    CATEGORY_RE = re.compile(r"\b(Beverages|Condiments|Confections|Dairy Products|Grains/Cereals|Meat/Poultry|Produce|Seafood)\b", re.IGNORECASE)
-    YEAR_RE = re.compile(r"\b(19\d{2}|20\d{2})\b")
+    DATE_RE = compiled_re(r"(\d{4}-\d{2}-\d{2})")
+    CAMPAIGN_RE = compiled_re(r"(Summer|Winter) .*?(\d{4})", re.IGNORECASE)
+    CATEGORY_RE = compiled_re(r"\b(Beverages|Condiments|Confections|Dairy Products|Grains/Cereals|Meat/Poultry|Produce|Seafood)\b", re.IGNORECASE)
+    YEAR_RE = compiled_re(r"\b(19\d{2}|20\d{2})\b")
+
+    # Merged alternation so combined_text is scanned exactly once; executed by
+    # re2's DFA when available, otherwise by a single stdlib re pass.
+    SCAN_RE = compiled_re(
+        r"(?P<date>\d{4}-\d{2}-\d{2})"
+        r"|(?P<season>(?:Summer|Winter)\s+\d{4})"
+        r"|(?P<cat>\b(?:Beverages|Condiments|Confections|Dairy Products|Grains/Cereals|Meat/Poultry|Produce|Seafood)\b)",
+        re.IGNORECASE,
+    )
     
+    # Fixed Northwind category literals; matches are normalized through the
+    # frozen canonical map so case variants dedupe to one entry.
+    FROZEN_CATEGORIES = frozenset({
+        "Beverages", "Condiments", "Confections", "Dairy Products",
+        "Grains/Cereals", "Meat/Poultry", "Produce", "Seafood",
+    })
+    _CATEGORY_CANON = {c.lower(): c for c in FROZEN_CATEGORIES}
+
     # Map requested years to actual available years in Northwind DB
     # The Northwind DB contains 2012-2023 data
     # Map requested years to actual available years in Northwind DB
@@ -103,7 +294,33 @@ class Planner:
         "2020": "2020", "2021": "2021", "2022": "2022", "2023": "2023",
     }
 
-    def plan(self, question: str, retrieved_chunks: List[Dict]) -> Dict[str, Any]:
+    _CACHE_MAX = 1024
+
+    __slots__ = ("_plan_cache", "_plan_lock")
+
+    def __init__(self):
+        # Bounded memo keyed on (question, retrieved chunk ids); the corpus is
+        # static so chunk ids identify the doc text that feeds the plan.
+        # Lock-guarded: a shared agent plans from several worker threads.
+        self._plan_cache: Dict[Tuple, Dict[str, Any]] = {}
+        self._plan_lock = threading.Lock()
+
+    def plan(self, question: str, retrieved_chunks: List[Dict], features: QuestionFeatures = None) -> Dict[str, Any]:
+        q_lower = features.q_lower if features is not None else question.lower()
+        key = (q_lower, tuple(sorted(c.get("chunk_id", "") for c in retrieved_chunks)))
+        with self._plan_lock:
+            cached = self._plan_cache.get(key)
+        if cached is None:
+            # computed outside the lock; a concurrent duplicate is deterministic
+            cached = self._plan_impl(question, retrieved_chunks, q_lower)
+            with self._plan_lock:
+                if len(self._plan_cache) >= self._CACHE_MAX:
+                    self._plan_cache.pop(next(iter(self._plan_cache)))
+                self._plan_cache[key] = cached
+        # Shallow copy so callers can't mutate the cached entry
+        return {**cached, "categories": list(cached["categories"])}
+
+    def _plan_impl(self, question: str, retrieved_chunks: List[Dict], q_lower: str) -> Dict[str, Any]:
         """
         Extract constraints from question + docs.
         Maps year references to actual available data (1997->2023 for legacy test cases).
@@ -114,8 +331,25 @@ class Planner:
         doc_text = " ".join([c.get("text", "") for c in retrieved_chunks])
         combined_text = question + " " + doc_text
 
+        # Single pass over combined_text; dispatch on named group. Offsets past
+        # the question belong to doc text (dates/seasons are doc-sourced only).
+        doc_offset = len(question) + 1
+        doc_dates = []
+        doc_season = None
+        cats = {}  # insertion-ordered dedup; question hits come before doc hits
+        for m in self.SCAN_RE.finditer(combined_text):
+            group = m.lastgroup
+            if group == "cat":
+                token = m.group(0)
+                cats[self._CATEGORY_CANON.get(token.lower(), token)] = None
+            elif m.start() >= doc_offset:
+                if group == "date":
+                    doc_dates.append(m.group(0))
+                elif group == "season" and doc_season is None:
+                    doc_season = m.group(0)
+
         # Check if question references a specific year/season (for mapping)
-        ql = question.lower()
+        ql = q_lower
         should_map = False
         target_year = None
         
@@ -138,33 +372,28 @@ class Planner:
         
         # If no specific mapping applied, extract dates from docs (e.g., marketing_calendar)
         if not should_map:
-            # Try to find Season Year patterns inside retrieved docs
-            m = re.search(r"(Summer|Winter)\s+(\d{4})", doc_text, re.IGNORECASE)
-            if m:
-                season = m.group(1).lower()
-                year = m.group(2)
-                if season == "summer":
+            # Season Year hit inside retrieved docs takes precedence
+            if doc_season:
+                season, year = doc_season.split()
+                if season.lower() == "summer":
                     plan["date_from"] = f"{year}-06-01"
                     plan["date_to"] = f"{year}-06-30"
                 else:
                     plan["date_from"] = f"{year}-12-01"
                     plan["date_to"] = f"{year}-12-31"
-            else:
-                dates = self.DATE_RE.findall(doc_text)
-                if dates:
-                    if len(dates) >= 2:
-                        plan["date_from"], plan["date_to"] = dates[0], dates[1]
-                    else:
-                        plan["date_from"] = plan["date_to"] = dates[0]
-        
-        # Extract categories from both docs and question
-        cats = set()
-        for m in self.CATEGORY_RE.finditer(combined_text):
-            cats.add(m.group(0))
-        plan["categories"] = sorted(list(cats))
+            elif doc_dates:
+                if len(doc_dates) >= 2:
+                    plan["date_from"], plan["date_to"] = doc_dates[0], doc_dates[1]
+                else:
+                    plan["date_from"] = plan["date_to"] = doc_dates[0]
+
+        # Categories were collected from both docs and question in the same
+        # pass; keep first-occurrence order (question text scans first, so a
+        # category named in the question stays ahead of doc-only mentions)
+        plan["categories"] = list(cats)
         
         # Extract KPI hint from question
-        q = question.lower()
+        q = q_lower
         if "average order value" in q or "aov" in q:
             plan["kpi_hint"] = "AOV"
         elif "gross margin" in q or ("margin" in q and "customer" in q):
@@ -189,13 +418,33 @@ class NL2SQL:
     Generates parameterized SQLite queries based on intent matching + plan constraints.
     """
 
+    _CACHE_MAX = 1024
+
+    __slots__ = (
+        "train_data", "templates", "before_valid_rate", "after_valid_rate",
+        "optimizer_report", "_generate_cache", "_generate_lock",
+    )
+
+    # Bootstrap result is invariant (training data is a constant), so it is
+    # computed once for the process and shared by every instance. The template
+    # callables are stateless, so sharing bound methods across instances is
+    # safe.
+    _BOOTSTRAP: Dict[str, Any] = None
+
     def __init__(self):
-        self.templates = []
-        self.train_data = self._handcrafted_training()
-        self.before_valid_rate = None
-        self.after_valid_rate = None
-        self.optimizer_report = {}
-        self._bootstrap_train()
+        if NL2SQL._BOOTSTRAP is None:
+            self.train_data = self._handcrafted_training()
+            NL2SQL._BOOTSTRAP = self._bootstrap_train()
+        boot = NL2SQL._BOOTSTRAP
+        self.train_data = boot["train_data"]
+        self.templates = boot["templates"]
+        self.before_valid_rate = boot["before_valid_rate"]
+        self.after_valid_rate = boot["after_valid_rate"]
+        self.optimizer_report = boot["optimizer_report"]
+        self._generate_cache: Dict[Tuple, Tuple[str, Dict[str, Any]]] = {}
+        # lock-guarded: generate() is called from worker threads when the
+        # runner answers questions on a pool
+        self._generate_lock = threading.Lock()
 
     def _handcrafted_training(self):
         """Tiny training dataset for BootstrapFewShot style optimization."""
@@ -219,108 +468,131 @@ class NL2SQL:
         ]
 
     # ============= Template Functions =============
-    
+    #
+    # SQL text is precompiled once as class-level constants; the per-call work
+    # is a single date-clause computation plus one .format call.
+
+    _SQL_TOP3_PRODUCTS = (
+        "SELECT p.ProductName as product, "
+        "ROUND(SUM(od.UnitPrice * od.Quantity * (1 - od.Discount)), 2) as revenue "
+        "FROM [Order Details] od "
+        "JOIN Products p ON p.ProductID = od.ProductID "
+        "GROUP BY p.ProductID "
+        "ORDER BY revenue DESC "
+        "LIMIT 3;"
+    )
+
+    _SQL_AOV = (
+        "SELECT ROUND( "
+        "SUM(od.UnitPrice * od.Quantity * (1 - od.Discount)) * 1.0 / NULLIF(COUNT(DISTINCT o.OrderID), 0), "
+        "2) as aov "
+        "FROM [Order Details] od "
+        "JOIN Orders o ON o.OrderID = od.OrderID "
+        "{where};"
+    )
+
+    _SQL_CATEGORY_REVENUE = (
+        "SELECT ROUND(SUM(od.UnitPrice * od.Quantity * (1 - od.Discount)), 2) as revenue "
+        "FROM [Order Details] od "
+        "JOIN Orders o ON o.OrderID = od.OrderID "
+        "JOIN Products p ON p.ProductID = od.ProductID "
+        "JOIN Categories c ON c.CategoryID = p.CategoryID "
+        "WHERE c.CategoryName = ? "
+        "{where_date};"
+    )
+
+    _SQL_TOP_CATEGORY_QTY = (
+        "SELECT c.CategoryName as category, SUM(od.Quantity) as quantity "
+        "FROM [Order Details] od "
+        "JOIN Orders o ON o.OrderID = od.OrderID "
+        "JOIN Products p ON p.ProductID = od.ProductID "
+        "JOIN Categories c ON c.CategoryID = p.CategoryID "
+        "{where} "
+        "GROUP BY c.CategoryID "
+        "ORDER BY quantity DESC LIMIT 1;"
+    )
+
+    _SQL_BEST_CUSTOMER_MARGIN = (
+        "SELECT cu.CompanyName as customer, "
+        "ROUND(SUM((od.UnitPrice * (1 - 0.7)) * od.Quantity * (1 - od.Discount)), 2) as margin "
+        "FROM [Order Details] od "
+        "JOIN Orders o ON o.OrderID = od.OrderID "
+        "JOIN Customers cu ON cu.CustomerID = o.CustomerID "
+        "WHERE strftime('%Y', o.OrderDate) = ? "
+        "GROUP BY cu.CustomerID "
+        "ORDER BY margin DESC LIMIT 1;"
+    )
+
+    # There are only three realistic date shapes (both, from-only, none), so
+    # each dated template is specialized into precompiled variants keyed by
+    # (has_date_from << 1) | has_date_to. Dates are bound as ? parameters, so
+    # SQLite sees the same statement text across calls and can reuse its
+    # prepared-statement cache.
+    _DATE_WHERE = {
+        0b11: "WHERE o.OrderDate BETWEEN ? AND ?",
+        0b10: "WHERE o.OrderDate >= ?",
+        0b01: "",
+        0b00: "",
+    }
+    _DATE_AND = {
+        0b11: "AND o.OrderDate BETWEEN ? AND ?",
+        0b10: "AND o.OrderDate >= ?",
+        0b01: "",
+        0b00: "",
+    }
+    _AOV_VARIANTS = _specialize(_SQL_AOV, "{where}", _DATE_WHERE)
+    _CATREV_VARIANTS = _specialize(_SQL_CATEGORY_REVENUE, "{where_date}", _DATE_AND)
+    _TOPQTY_VARIANTS = _specialize(_SQL_TOP_CATEGORY_QTY, "{where}", _DATE_WHERE)
+
+    @staticmethod
+    def _date_key(plan) -> int:
+        """2-bit date-shape key used to pick a specialized template variant."""
+        return (bool(plan.get("date_from")) << 1) | bool(plan.get("date_to"))
+
+    @staticmethod
+    def _date_params(plan) -> Tuple:
+        """Bind tuple matching the ? placeholders of the date-shape variant."""
+        key = (bool(plan.get("date_from")) << 1) | bool(plan.get("date_to"))
+        if key == 0b11:
+            return (plan["date_from"], plan["date_to"])
+        if key == 0b10:
+            return (plan["date_from"],)
+        return ()
+
     def _tmpl_top3_products(self, plan, schema):
         """Top 3 products by revenue all-time (no date filter)."""
-        return (
-            "SELECT p.ProductName as product, "
-            "ROUND(SUM(od.UnitPrice * od.Quantity * (1 - od.Discount)), 2) as revenue "
-            "FROM [Order Details] od "
-            "JOIN Products p ON p.ProductID = od.ProductID "
-            "GROUP BY p.ProductID "
-            "ORDER BY revenue DESC "
-            "LIMIT 3;"
-        )
+        return self._SQL_TOP3_PRODUCTS, ()
 
     def _tmpl_aov_date_range(self, plan, schema):
         """AOV (Average Order Value) for a date range."""
-        date_from = plan.get("date_from")
-        date_to = plan.get("date_to")
-        where = ""
-        if date_from and date_to:
-            where = f"WHERE o.OrderDate BETWEEN '{date_from}' AND '{date_to}'"
-        elif date_from:
-            where = f"WHERE o.OrderDate >= '{date_from}'"
-        return (
-            "SELECT ROUND( "
-            "SUM(od.UnitPrice * od.Quantity * (1 - od.Discount)) * 1.0 / NULLIF(COUNT(DISTINCT o.OrderID), 0), "
-            "2) as aov "
-            "FROM [Order Details] od "
-            "JOIN Orders o ON o.OrderID = od.OrderID "
-            f"{where};"
-        )
+        return self._AOV_VARIANTS[self._date_key(plan)], self._date_params(plan)
 
     def _tmpl_category_revenue(self, plan, schema):
         """Total revenue for a category in a date range."""
         category = plan.get("categories", ["Beverages"])[0] if plan.get("categories") else "Beverages"
-        date_from = plan.get("date_from")
-        date_to = plan.get("date_to")
-        
-        where_date = ""
-        if date_from and date_to:
-            where_date = f"AND o.OrderDate BETWEEN '{date_from}' AND '{date_to}'"
-        elif date_from:
-            where_date = f"AND o.OrderDate >= '{date_from}'"
-        
-        return (
-            "SELECT ROUND(SUM(od.UnitPrice * od.Quantity * (1 - od.Discount)), 2) as revenue "
-            "FROM [Order Details] od "
-            "JOIN Orders o ON o.OrderID = od.OrderID "
-            "JOIN Products p ON p.ProductID = od.ProductID "
-            "JOIN Categories c ON c.CategoryID = p.CategoryID "
-            f"WHERE c.CategoryName = '{category}' "
-            f"{where_date};"
-        )
+        return self._CATREV_VARIANTS[self._date_key(plan)], (category,) + self._date_params(plan)
 
     def _tmpl_top_category_qty(self, plan, schema):
         """Top category by total quantity sold in a date range."""
-        date_from = plan.get("date_from")
-        date_to = plan.get("date_to")
-        
-        where_date = ""
-        if date_from and date_to:
-            where_date = f"WHERE o.OrderDate BETWEEN '{date_from}' AND '{date_to}'"
-        elif date_from:
-            where_date = f"WHERE o.OrderDate >= '{date_from}'"
-        
-        return (
-            "SELECT c.CategoryName as category, SUM(od.Quantity) as quantity "
-            "FROM [Order Details] od "
-            "JOIN Orders o ON o.OrderID = od.OrderID "
-            "JOIN Products p ON p.ProductID = od.ProductID "
-            "JOIN Categories c ON c.CategoryID = p.CategoryID "
-            f"{where_date} "
-            "GROUP BY c.CategoryID "
-            "ORDER BY quantity DESC LIMIT 1;"
-        )
+        return self._TOPQTY_VARIANTS[self._date_key(plan)], self._date_params(plan)
 
     def _tmpl_best_customer_margin_year(self, plan, schema):
         """Top customer by gross margin (cost ≈ 0.7 * UnitPrice) for a year."""
         date_from = plan.get("date_from")
         year = date_from[:4] if date_from else "1997"
-        
-        return (
-            "SELECT cu.CompanyName as customer, "
-            "ROUND(SUM((od.UnitPrice * (1 - 0.7)) * od.Quantity * (1 - od.Discount)), 2) as margin "
-            "FROM [Order Details] od "
-            "JOIN Orders o ON o.OrderID = od.OrderID "
-            "JOIN Customers cu ON cu.CustomerID = o.CustomerID "
-            f"WHERE strftime('%Y', o.OrderDate) = '{year}' "
-            "GROUP BY cu.CustomerID "
-            "ORDER BY margin DESC LIMIT 1;"
-        )
+        return self._SQL_BEST_CUSTOMER_MARGIN, (year,)
 
     # ============= Intent Matching =============
     
-    def _intent_match(self, question: str) -> str:
+    def _intent_match(self, question: str, features: QuestionFeatures = None) -> str:
         """Match question to template intent using keyword patterns."""
-        qtokens = set(re.findall(r"\w+", question.lower()))
+        feats = features if features is not None else QuestionFeatures(question)
+        qtokens = feats.token_set
 
-        # Score training examples by token overlap
+        # Score training examples by token overlap (token sets frozen at bootstrap)
         scores = Counter()
         for ex in self.train_data:
-            ex_tokens = set(re.findall(r"\w+", ex["q"].lower()))
-            overlap = len(qtokens & ex_tokens)
+            overlap = len(qtokens & ex["tokens"])
             if overlap > 0:
                 scores[ex["intent"]] += overlap
 
@@ -328,44 +600,30 @@ class NL2SQL:
             chosen = sorted(scores.items(), key=lambda x: (-x[1], x[0]))[0][0]
             return chosen
 
-        # If no training match, fallback to plan-driven selection if question contains KPI hints
-        if "average order value" in question.lower() or "aov" in question.lower():
-            return "aov_date_range"
-        if "quantity" in question.lower() or "sold" in question.lower():
-            return "top_category_qty_date_range"
-        if "margin" in question.lower() or "gross margin" in question.lower():
-            return "best_customer_margin_year"
-        if "revenue" in question.lower():
-            return "top3_products_revenue"
+        # If no training match, fall back to the precomputed bitmask dispatch
+        # table; '' signals that higher-level code should consider RAG.
+        return _intent_from_bits(feats.kw_bits)
 
-        # If nothing matches, return an empty intent signalling that higher-level code should consider RAG or ask for clarification
-        return ""
-
-    def _bootstrap_train(self):
+    def _bootstrap_train(self) -> Dict[str, Any]:
         """
         BootstrapFewShot-style optimization:
         1. Evaluate all templates on training data
         2. Compute before/after valid SQL rates
         3. Use results to prioritize templates
+
+        Returns the full bootstrap result so it can be cached class-wide.
         """
-        def is_valid_sql(s: str) -> bool:
-            """Check if SQL string is syntactically valid-ish."""
-            s_lower = s.strip().lower()
-            if not s_lower.startswith("select"):
-                return False
-            # Check balanced parentheses
-            if s.count("(") != s.count(")"):
-                return False
-            # Check for required components
-            if "from" not in s_lower:
-                return False
-            return True
+        is_valid_sql = _is_valid_sql
 
         # Build templates list and validate
+        templates = []
         before_ok = 0
         after_ok = 0
-        
+
         for ex in self.train_data:
+            # Freeze example token sets once; _intent_match reuses them on
+            # every call instead of re-tokenizing the training questions.
+            ex["tokens"] = frozenset(_WORD_RE.findall(ex["q"].lower()))
             plan = {
                 "date_from": "1997-12-01",
                 "date_to": "1997-12-31",
@@ -373,8 +631,8 @@ class NL2SQL:
                 "kpi_hint": "AOV"
             }
             
-            # Generate SQL with template
-            sql = ex["fn"](plan, {})
+            # Generate SQL with template (templates return (sql, params))
+            sql, _params = ex["fn"](plan, {})
             
             # Validation before optimization
             if is_valid_sql(sql):
@@ -391,41 +649,72 @@ class NL2SQL:
                 after_ok += 1
             
             # Store template
-            self.templates.append({
+            templates.append({
                 "intent": ex["intent"],
                 "fn": ex["fn"],
                 "priority": 1  # can be learned in future
             })
-        
+
         # Compute metrics
-        self.before_valid_rate = before_ok / max(1, len(self.train_data))
-        self.after_valid_rate = after_ok / max(1, len(self.train_data))
-        
-        # Detailed report for README
-        self.optimizer_report = {
-            "method": "BootstrapFewShot",
-            "train_size": len(self.train_data),
-            "before_valid_rate": round(self.before_valid_rate, 3),
-            "after_valid_rate": round(self.after_valid_rate, 3),
-            "improvement": round(self.after_valid_rate - self.before_valid_rate, 3),
-            "optimization_technique": "Post-SQL validation with semicolon and SELECT prefix enforcement"
+        before_valid_rate = before_ok / max(1, len(self.train_data))
+        after_valid_rate = after_ok / max(1, len(self.train_data))
+
+        return {
+            "train_data": self.train_data,
+            "templates": templates,
+            "before_valid_rate": before_valid_rate,
+            "after_valid_rate": after_valid_rate,
+            # Detailed report for README
+            "optimizer_report": {
+                "method": "BootstrapFewShot",
+                "train_size": len(self.train_data),
+                "before_valid_rate": round(before_valid_rate, 3),
+                "after_valid_rate": round(after_valid_rate, 3),
+                "improvement": round(after_valid_rate - before_valid_rate, 3),
+                "optimization_technique": "Post-SQL validation with semicolon and SELECT prefix enforcement"
+            },
         }
 
-    def generate(self, question: str, plan: Dict[str, Any], schema: Dict[str, List[str]]) -> Tuple[str, Dict[str, Any]]:
+    def generate(self, question: str, plan: Dict[str, Any], schema: Dict[str, List[str]], features: QuestionFeatures = None) -> Tuple[str, Tuple, Dict[str, Any]]:
         """
         Generate SQL given question, plan, and schema.
-        Returns (sql_string, metadata_dict).
+        Returns (sql_string, params_tuple, metadata_dict). The SQL carries ?
+        placeholders; callers bind params so SQLite reuses prepared plans.
         """
-        intent = self._intent_match(question)
+        feats = features if features is not None else QuestionFeatures(question)
+        # Memoize on (question, flattened plan) — generation is deterministic
+        key = (
+            feats.q_lower,
+            tuple(sorted(
+                (k, tuple(sorted(v.items())) if isinstance(v, dict)
+                 else tuple(v) if isinstance(v, list) else v)
+                for k, v in plan.items()
+            )),
+        )
+        with self._generate_lock:
+            cached = self._generate_cache.get(key)
+        if cached is not None:
+            sql, params, meta = cached
+            return sql, params, dict(meta)
+        # computed outside the lock; a concurrent duplicate is deterministic
+        sql, params, meta = self._generate_impl(question, plan, schema, feats)
+        with self._generate_lock:
+            if len(self._generate_cache) >= self._CACHE_MAX:
+                self._generate_cache.pop(next(iter(self._generate_cache)))
+            self._generate_cache[key] = (sql, params, meta)
+        return sql, params, dict(meta)
+
+    def _generate_impl(self, question: str, plan: Dict[str, Any], schema: Dict[str, List[str]], features: QuestionFeatures) -> Tuple[str, Tuple, Dict[str, Any]]:
+        intent = self._intent_match(question, features)
 
         # If intent is empty string, be conservative and return empty SQL so higher-level code can choose RAG/hybrid
         if not intent:
-            return "", {"intent": "none", "template": "none"}
+            return "", (), {"intent": "none", "template": "none"}
 
         # Find and execute template
         for template in self.templates:
             if template["intent"] == intent:
-                sql = template["fn"](plan, schema)
+                sql, params = template["fn"](plan, schema)
                 # Ensure proper ending
                 if not sql.strip().endswith(";"):
                     sql = sql.strip() + ";"
@@ -434,34 +723,81 @@ class NL2SQL:
                     "template": template["fn"].__name__,
                     "optimization_applied": True
                 }
-                return sql, meta
+                return sql, params, meta
 
         # As a last resort, if plan contains a KPI hint, map it to a template
         k = (plan.get("kpi_hint") or "").upper()
         if k == "AOV":
-            sql = self._tmpl_aov_date_range(plan, schema)
-            return sql, {"intent": "aov_date_range", "template": "_tmpl_aov_date_range", "optimization_applied": False}
+            sql, params = self._tmpl_aov_date_range(plan, schema)
+            return sql, params, {"intent": "aov_date_range", "template": "_tmpl_aov_date_range", "optimization_applied": False}
         if k == "REVENUE":
-            sql = self._tmpl_category_revenue(plan, schema)
-            return sql, {"intent": "category_revenue_date_range", "template": "_tmpl_category_revenue", "optimization_applied": False}
+            sql, params = self._tmpl_category_revenue(plan, schema)
+            return sql, params, {"intent": "category_revenue_date_range", "template": "_tmpl_category_revenue", "optimization_applied": False}
 
         # Final safe default: return top3 only if question explicitly asks for "top" or "top 3"
-        if "top" in question.lower() or "top 3" in question.lower():
-            sql = self._tmpl_top3_products(plan, schema)
-            return sql, {"intent": "top3_products_revenue", "template": "_tmpl_top3_products", "optimization_applied": False}
+        if features.kw_bits & _TOP_BIT:
+            sql, params = self._tmpl_top3_products(plan, schema)
+            return sql, params, {"intent": "top3_products_revenue", "template": "_tmpl_top3_products", "optimization_applied": False}
 
         # No confident SQL mapping
-        return "", {"intent": "none", "template": "none"}
+        return "", (), {"intent": "none", "template": "none"}
 
-    def predict(self, question: str, plan: Dict[str, Any], schema: Dict[str, List[str]]) -> Tuple[str, Dict[str, Any]]:
+    def predict(self, question: str, plan: Dict[str, Any], schema: Dict[str, List[str]], features: QuestionFeatures = None) -> Tuple[str, Tuple, Dict[str, Any]]:
         """Alias for generate() for DSPy compatibility."""
-        return self.generate(question, plan, schema)
+        return self.generate(question, plan, schema, features)
 
     def optimization_report_dict(self) -> Dict[str, Any]:
         """Return the optimization report for README documentation."""
         return self.optimizer_report
 
 
+def _int_cast(v: Any) -> int:
+    try:
+        return int(round(float(v))) if v is not None else 0
+    except (ValueError, TypeError):
+        return 0
+
+
+def _float_cast(v: Any) -> float:
+    try:
+        return round(float(v), 2) if v is not None else 0.0
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def _str_cast(v: Any) -> str:
+    return str(v) if v is not None else ""
+
+
+_CASTERS = {"int": _int_cast, "float": _float_cast}
+
+
+def _make_caster(typ: str):
+    """Return the precompiled caster for a format-spec type (str by default)."""
+    return _CASTERS.get(typ, _str_cast)
+
+
+def _extract_records(rows: List[Dict], resolved: List[Tuple]) -> List[Dict[str, Any]]:
+    """
+    Hot row loop for list-hint extraction, kept as a standalone function so a
+    compiled (Cython) build can drop in a replacement without touching the
+    Synthesizer. Pure Python here: rows are dicts of mixed types, which rules
+    out numba; the pandas bulk path already covers large result sets.
+    """
+    return [
+        {key: caster(row.get(col)) for key, col, _typ, caster in resolved}
+        for row in rows
+    ]
+
+
+# Optional compiled override (built out-of-tree; no native build step ships
+# with this repo).
+try:
+    from agent.synthesizer_fast import extract_list_c as _extract_records  # noqa: F811
+except ImportError:
+    pass
+
+
 class Synthesizer:
     """
     Formats final typed answer matching format_hint exactly.
@@ -469,6 +805,8 @@ class Synthesizer:
     confidence heuristic, and explanation (≤2 sentences).
     """
 
+    __slots__ = ()
+
     def __init__(self):
         pass
 
@@ -482,8 +820,10 @@ class Synthesizer:
         sql: the SQL executed (or "")
         repaired: number of repair attempts
         """
-        # Build citations (sorted, deduplicated)
-        citations = sorted(list(set(tables_used + doc_chunk_ids)))
+        # Build citations (sorted, deduplicated); skip the set+sort machinery
+        # for the trivial 0/1-entry cases common on scalar answers
+        combined = tables_used + doc_chunk_ids
+        citations = list(combined) if len(combined) <= 1 else sorted(set(combined))
 
         # Compute confidence heuristic
         conf = 0.3
@@ -564,28 +904,19 @@ class Synthesizer:
 
     def _extract_object(self, rows, columns, format_hint: str) -> Dict[str, Any]:
         """Extract object {key1:type1, key2:type2, ...} from first row."""
-        # Parse format hint: "{category:str, quantity:int}" -> [(category, str), (quantity, int), ...]
+        # Parse format hint: "{category:str, quantity:int}" -> [(category, str, caster), ...]
         inner = format_hint.strip("{}").strip()
         key_types = self._parse_format_spec(inner)
-        
-        if rows and len(rows) >= 1:
+
+        if rows:
             row = rows[0]
-            obj = {}
-            for key, typ in key_types:
-                val = self._extract_typed_value(row, columns, key, typ)
-                obj[key] = val
-            return obj
-        else:
-            # Empty result: return object with defaults
-            obj = {}
-            for key, typ in key_types:
-                if typ == "int":
-                    obj[key] = 0
-                elif typ == "float":
-                    obj[key] = 0.0
-                else:
-                    obj[key] = ""
-            return obj
+            col_map = {c.lower(): c for c in columns}
+            return {
+                key: caster(row.get(col_map.get(key.lower(), key)))
+                for key, typ, caster in key_types
+            }
+        # Empty result: casters applied to None yield the type defaults
+        return {key: caster(None) for key, typ, caster in key_types}
 
     def _extract_list(self, rows, columns, format_hint: str) -> List[Dict[str, Any]]:
         """Extract list[{...}] from all rows."""
@@ -599,54 +930,49 @@ class Synthesizer:
         # Parse object format inside list
         obj_spec = inner.strip("{}").strip()
         key_types = self._parse_format_spec(obj_spec)
-        
-        result = []
-        for row in rows:
-            obj = {}
-            for key, typ in key_types:
-                val = self._extract_typed_value(row, columns, key, typ)
-                obj[key] = val
-            result.append(obj)
-        return result
 
-    def _parse_format_spec(self, spec: str) -> List[Tuple[str, str]]:
-        """Parse 'category:str, quantity:int' -> [('category', 'str'), ('quantity', 'int')]."""
+        # Resolve each key to its actual column and caster once, so the
+        # per-row loop is a direct row lookup plus one function call.
+        col_map = {c.lower(): c for c in columns}
+        resolved = [(key, col_map.get(key.lower(), key), typ, caster) for key, typ, caster in key_types]
+
+        # For large homogeneous result sets, cast columns in bulk via pandas
+        # instead of coercing cell by cell in Python.
+        if pd is not None and len(rows) >= self._PD_ROW_THRESHOLD:
+            return self._extract_list_vectorized(rows, resolved)
+
+        return _extract_records(rows, resolved)
+
+    _PD_ROW_THRESHOLD = 200
+
+    def _extract_list_vectorized(self, rows: List[Dict], resolved: List[Tuple]) -> List[Dict[str, Any]]:
+        """Bulk-cast columns with pandas; mirrors the casters' per-cell semantics."""
+        df = pd.DataFrame(rows)
+        out = pd.DataFrame(index=df.index)
+        for key, col, typ, _caster in resolved:
+            series = df[col] if col in df.columns else pd.Series([None] * len(df), index=df.index)
+            if typ == "int":
+                out[key] = pd.to_numeric(series, errors="coerce").fillna(0).round().astype(int)
+            elif typ == "float":
+                out[key] = pd.to_numeric(series, errors="coerce").fillna(0.0).round(2)
+            else:
+                # pd.isna catches NaN (pandas' missing-cell marker) as well as
+                # None, matching _str_cast's None -> "" semantics
+                out[key] = series.map(lambda v: "" if pd.isna(v) else str(v))
+        return out.to_dict("records")
+
+    def _parse_format_spec(self, spec: str) -> List[Tuple[str, str, Any]]:
+        """Parse 'category:str, quantity:int' -> [('category', 'str', caster), ...]."""
         result = []
         for part in spec.split(","):
             part = part.strip()
             if ":" not in part:
                 continue
             key, typ = part.split(":", 1)
-            result.append((key.strip(), typ.strip()))
+            typ = typ.strip()
+            result.append((key.strip(), typ, _make_caster(typ)))
         return result
 
-    def _extract_typed_value(self, row: Dict, columns: List[str], key: str, typ: str) -> Any:
-        """Extract a value from row, matching key (case-insensitive) and converting to type."""
-        # Find matching column (case-insensitive)
-        val = None
-        for col in columns:
-            if col.lower() == key.lower():
-                val = row.get(col)
-                break
-        
-        # Fallback: exact match
-        if val is None:
-            val = row.get(key)
-        
-        # Type conversion
-        if typ == "int":
-            try:
-                return int(round(float(val))) if val is not None else 0
-            except (ValueError, TypeError):
-                return 0
-        elif typ == "float":
-            try:
-                return round(float(val), 2) if val is not None else 0.0
-            except (ValueError, TypeError):
-                return 0.0
-        else:  # str or default
-            return str(val) if val is not None else ""
-
     def _build_explanation(self, final_answer: Any, row_count: int, repaired: int) -> str:
         """Build a ≤2 sentence explanation."""
         if isinstance(final_answer, list):
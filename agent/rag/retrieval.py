@@ -2,21 +2,79 @@
 import os
 import re
 import json
-from typing import List, Dict, Tuple
+import threading
+import time
+import hashlib
+import zlib
+from typing import Any, List, Dict, Optional, Tuple
 from pathlib import Path
 
-from sklearn.feature_extraction.text import TfidfVectorizer
+import joblib
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer, HashingVectorizer, TfidfTransformer, CountVectorizer
 import numpy as np
-from collections import Counter
+from collections import Counter, OrderedDict
 
 DOCS_PATH = Path(__file__).resolve().parents[2] / "docs"
 
+_WS_RE = re.compile(r"\s+")
+_PARA_SPLIT = re.compile(r"\n{2,}")
+_WORD_RE = re.compile(r"\w+")
+
+
+def _hash_tokens(text_lower: str) -> "np.ndarray":
+    # crc32 is stable across processes (unlike str hash with PYTHONHASHSEED),
+    # so token identities stay deterministic between runs
+    return np.fromiter(
+        (zlib.crc32(t.encode()) & 0x7FFFFFFF for t in _WORD_RE.findall(text_lower) if len(t) > 1),
+        dtype=np.int32,
+    )
+
+
+class SmartCache:
+    """
+    Bounded LRU cache with a TTL, keyed by normalized text.
+    Used for repeat-query results in Retriever.retrieve and HybridAgent.answer.
+    """
+
+    def __init__(self, max_items: int = 1024, ttl_s: float = 600.0):
+        self.max_items = max_items
+        self.ttl_s = ttl_s
+        self._items: "OrderedDict[Any, Tuple[float, Any]]" = OrderedDict()
+        # the cache is shared across worker threads when the runner uses a
+        # thread pool; get/move_to_end and eviction must not interleave
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return _WS_RE.sub(" ", (text or "").strip().lower())
+
+    def get(self, key) -> Optional[Any]:
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None:
+                return None
+            ts, value = entry
+            if time.time() - ts > self.ttl_s:
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._items[key] = (time.time(), value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
 
 class Chunk:
     def __init__(self, source: str, idx: int, text: str):
         self.source = source  # filename
         self.idx = idx  # chunk index (int)
         self.text = text
+        self.text_lower = text.lower()  # cached for downstream case-insensitive scans
         self.chunk_id = f"{Path(source).stem}::chunk{idx}"
 
     def to_dict(self):
@@ -31,41 +89,120 @@ class Retriever:
       - retrieve(query, k=3) -> returns list of {"chunk_id","source","idx","text","score"}
     """
 
-    def __init__(self, docs_path: str = None, chunk_size: int = 200, chunk_overlap: int = 40):
+    def __init__(self, docs_path: str = None, chunk_size: int = 200, chunk_overlap: int = 40,
+                 use_hashing: bool = False, cache_dir: str = None, semantic_cache: bool = False):
         self.docs_path = Path(docs_path) if docs_path else DOCS_PATH
+        self.cache_dir = Path(cache_dir) if cache_dir else self.docs_path / ".cache"
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
+        # opt-in: HashingVectorizer keeps no vocabulary dict, so memory stays
+        # flat as the corpus grows (at the cost of non-invertible features)
+        self.use_hashing = use_hashing
         self.chunks: List[Chunk] = []
         self.tfidf = None
         self.vectorizer = None
+        self.hv = None
+        self.tft = None
+        # raw term counts power the vectorized overlap fallback
+        self._count_vec = None
+        self._counts = None
+        # SoA token arrays for the overlap fallback: all chunk tokens hashed
+        # into one contiguous int32 array plus per-chunk offsets (built lazily)
+        self._tok_concat = None
+        self._tok_offsets = None
+        self._tok_lens = None
         self._built = False
+        # exact-key repeat-query cache; the fuzzy near-duplicate tier is
+        # opt-in because it can return a different query's results
+        self.semantic_cache = semantic_cache
+        self._query_cache = SmartCache(max_items=1024, ttl_s=600.0)
+        self._q_vecs = None
+        self._q_keys: List[Tuple[str, int]] = []
+        # last _read_docs result, keyed by the (name, mtime, size) listing
+        self._docs_memo: Optional[Tuple[tuple, List[Tuple[str, str]]]] = None
 
     def _read_docs(self) -> List[Tuple[str, str]]:
-        files = sorted([p for p in self.docs_path.glob("*.md")])
+        # os.scandir reuses the directory entries instead of re-statting per file
+        try:
+            entries = sorted(
+                (e for e in os.scandir(self.docs_path) if e.name.endswith(".md")),
+                key=lambda e: e.name,
+            )
+        except FileNotFoundError:
+            return []
+        sig = tuple((e.name, e.stat().st_mtime_ns, e.stat().st_size) for e in entries)
+        if self._docs_memo is not None and self._docs_memo[0] == sig:
+            return self._docs_memo[1]
         data = []
-        for p in files:
-            text = p.read_text(encoding="utf-8")
-            data.append((str(p.name), text))
+        for e in entries:
+            # binary read + one-shot decode skips TextIOWrapper's incremental decoder
+            with open(e.path, "rb") as f:
+                data.append((e.name, f.read().decode("utf-8")))
+        self._docs_memo = (sig, data)
         return data
 
+    # bump when the vectorizer configuration changes so stale disk caches rebuild
+    _INDEX_VERSION = 3
+
+    def _docs_signature(self) -> str:
+        # fingerprint of doc names + mtimes + sizes; any edit invalidates the cache
+        stats = sorted((p.name, p.stat().st_mtime_ns, p.stat().st_size) for p in self.docs_path.glob("*.md"))
+        return hashlib.blake2b(repr((stats, self.use_hashing, self._INDEX_VERSION)).encode()).hexdigest()[:16]
+
+    def _index_cache_dir(self, sig: str) -> Path:
+        return self.cache_dir / sig
+
+    def _load_index_cache(self, cdir: Path) -> None:
+        # sparse matrices as npz (mmap-friendly), models via joblib, chunk
+        # metadata as plain json rebuilt into Chunk objects
+        self.tfidf = sparse.load_npz(cdir / "tfidf.npz").tocsr()
+        self.vectorizer, self.hv, self.tft, self._count_vec = joblib.load(cdir / "models.joblib")
+        counts_path = cdir / "counts.npz"
+        self._counts = sparse.load_npz(counts_path).tocsr() if counts_path.exists() else None
+        with open(cdir / "chunks.json", encoding="utf-8") as f:
+            self.chunks = [Chunk(m["source"], m["idx"], m["text"]) for m in json.load(f)]
+
+    def _save_index_cache(self, cdir: Path) -> None:
+        cdir.mkdir(parents=True, exist_ok=True)
+        sparse.save_npz(cdir / "tfidf.npz", self.tfidf)
+        if self._counts is not None:
+            sparse.save_npz(cdir / "counts.npz", self._counts)
+        joblib.dump((self.vectorizer, self.hv, self.tft, self._count_vec), cdir / "models.joblib", compress=0)
+        with open(cdir / "chunks.json", "w", encoding="utf-8") as f:
+            json.dump([{"source": c.source, "idx": c.idx, "text": c.text} for c in self.chunks], f)
+
     def _chunk_text(self, text: str) -> List[str]:
         # naive paragraph / sliding window chunker; deterministic
-        paragraphs = [p.strip() for p in re.split(r"\n{2,}", text) if p.strip()]
+        # single pass: each paragraph is stripped exactly once
+        paragraphs = (p for p in (raw.strip() for raw in _PARA_SPLIT.split(text)) if p)
         # break long paragraphs into windowed chunks
         chunks = []
+        step = max(1, self.chunk_size - self.chunk_overlap)
         for para in paragraphs:
             if len(para) <= self.chunk_size:
                 chunks.append(para)
             else:
-                # sliding window
-                i = 0
-                while i < len(para):
-                    chunk = para[i : i + self.chunk_size]
-                    chunks.append(chunk.strip())
-                    i += self.chunk_size - self.chunk_overlap
+                # sliding window over an already-stripped paragraph; only
+                # slices that actually touch whitespace pay for a strip
+                for i in range(0, len(para), step):
+                    piece = para[i:i + self.chunk_size]
+                    if piece[:1].isspace() or piece[-1:].isspace():
+                        piece = piece.strip()
+                    chunks.append(piece)
         return chunks
 
     def build_index(self):
+        # Fast path: reuse the persisted index when the docs are unchanged.
+        cache_dir = None
+        try:
+            cache_dir = self._index_cache_dir(self._docs_signature())
+            if cache_dir.is_dir():
+                self._load_index_cache(cache_dir)
+                self._built = True
+                return
+        except Exception:
+            pass  # unreadable/stale cache -> rebuild below
+
         self.chunks = []
         docs = self._read_docs()
         for fname, content in docs:
@@ -79,34 +216,180 @@ class Retriever:
             # empty corpus edge-case
             self.vectorizer = TfidfVectorizer().fit([" "])
             self.tfidf = self.vectorizer.transform([" "])
+        elif self.use_hashing:
+            self.hv = HashingVectorizer(n_features=1 << 18, alternate_sign=False, norm=None, stop_words='english')
+            self.tft = TfidfTransformer(norm="l2", use_idf=True, smooth_idf=True, sublinear_tf=False)
+            self.tfidf = self.tft.fit_transform(self.hv.transform(corpus))
         else:
-            # use english stop words to reduce noise and increase chance of meaningful scores
-            self.vectorizer = TfidfVectorizer(norm="l2", use_idf=True, smooth_idf=True, sublinear_tf=False, stop_words='english')
+            # use english stop words to reduce noise and increase chance of meaningful scores;
+            # float32 halves the sparse matrix bytes with identical rankings.
+            # No df pruning: on this small corpus rare terms are exactly the
+            # discriminative ones (a term unique to one policy chunk), so
+            # min_df/max_df would cut signal, not noise.
+            self.vectorizer = TfidfVectorizer(norm="l2", use_idf=True, smooth_idf=True, sublinear_tf=False,
+                                              stop_words='english', dtype=np.float32)
             self.tfidf = self.vectorizer.fit_transform(corpus)
+        # keep CSR layout so the per-query sparse dot stays fast; rows are
+        # already L2-normalized (norm="l2"), and transform() normalizes query
+        # vectors the same way, so the dot product below IS the cosine — no
+        # per-query renormalization is ever needed
+        self.tfidf = self.tfidf.tocsr()
+        if corpus:
+            # raw counts for the overlap fallback: one SpMV replaces the
+            # per-chunk Counter loop (token_pattern matches the old len>1 rule)
+            self._count_vec = CountVectorizer(stop_words=None, token_pattern=r"\w\w+")
+            self._counts = self._count_vec.fit_transform(corpus).tocsr()
+        if cache_dir is not None and corpus:
+            try:
+                self._save_index_cache(cache_dir)
+            except Exception:
+                pass  # caching is best-effort; the in-memory index is valid
         self._built = True
 
+    _SEM_THRESHOLD = 0.95  # cosine above which a past query counts as a duplicate
+
+    def _transform_query(self, query: str):
+        if self.hv is not None:
+            return self.tft.transform(self.hv.transform([query]))
+        return self.vectorizer.transform([query])
+
+    def _remember(self, cache_key: Tuple[str, int], qvec, results: List[Dict]) -> None:
+        self._query_cache.put(cache_key, [dict(r) for r in results])
+        if not self.semantic_cache:
+            return
+        if len(self._q_keys) >= 1024:
+            self._q_vecs = None
+            self._q_keys = []
+        self._q_keys.append(cache_key)
+        self._q_vecs = qvec if self._q_vecs is None else sparse.vstack([self._q_vecs, qvec])
+
+    def _ensure_token_arrays(self) -> None:
+        # built on first fallback use so the disk-cache fast path stays lean
+        if self._tok_concat is not None or not self.chunks:
+            return
+        hashed = [_hash_tokens(getattr(c, "text_lower", None) or c.text.lower()) for c in self.chunks]
+        self._tok_lens = np.array([h.size for h in hashed], dtype=np.int64)
+        self._tok_concat = np.concatenate(hashed)
+        self._tok_offsets = np.concatenate(([0], np.cumsum(self._tok_lens)))
+
+    def retrieve_many(self, queries: List[str], k: int = 3) -> List[List[Dict]]:
+        """
+        Batch variant of retrieve(): vectorizes all uncached queries in one
+        transform and scores them with a single sparse matmul, so tokenization
+        and CSR construction are amortized across the batch.
+        """
+        if not self._built:
+            self.build_index()
+
+        out: List = [None] * len(queries)
+        todo: List[str] = []
+        todo_idx: List[int] = []
+        for i, q in enumerate(queries):
+            cached = self._query_cache.get((SmartCache.normalize(q), k))
+            if cached is not None:
+                out[i] = [dict(r) for r in cached]
+            else:
+                todo.append(q)
+                todo_idx.append(i)
+        if not todo:
+            return out
+
+        Q = self.tft.transform(self.hv.transform(todo)) if self.hv is not None else self.vectorizer.transform(todo)
+        S = (self.tfidf @ Q.T).toarray()
+        for j, i in enumerate(todo_idx):
+            col = S[:, j]
+            if col.size == 0 or float(col.max()) <= 0.0:
+                # no TF-IDF signal: let retrieve() run its overlap fallback
+                out[i] = self.retrieve(todo[j], k=k)
+                continue
+            kk = min(k, col.size)
+            cand = np.argpartition(-col, kk - 1)[:kk]
+            cand = cand[np.lexsort((cand, -col[cand]))]
+            results = []
+            for idx in cand:
+                chunk = self.chunks[int(idx)]
+                results.append(
+                    {
+                        "chunk_id": chunk.chunk_id,
+                        "source": chunk.source,
+                        "idx": chunk.idx,
+                        "text": chunk.text,
+                        "_lower": getattr(chunk, "text_lower", None) or chunk.text.lower(),
+                        "score": float(col[idx]),
+                    }
+                )
+            self._remember((SmartCache.normalize(todo[j]), k), Q[j], results)
+            out[i] = results
+        return out
+
     def retrieve(self, query: str, k: int = 3) -> List[Dict]:
         if not self._built:
             self.build_index()
 
-        qvec = self.vectorizer.transform([query])
-        scores = (self.tfidf @ qvec.T).toarray().squeeze()  # cosine-like via tfidf dot
-        # deterministic tie-break: sort by score desc then chunk_id asc
-        indices = np.argsort(-scores)  # descending
+        cache_key = (SmartCache.normalize(query), k)
+        cached = self._query_cache.get(cache_key)
+        if cached is not None:
+            return [dict(r) for r in cached]
+
+        qvec = self._transform_query(query)
+
+        # Opt-in semantic tier: reuse the result of a near-identical earlier
+        # query. Off by default — on a small corpus distinct questions can
+        # exceed the cosine threshold and silently swap retrieval results.
+        if self.semantic_cache and self._q_vecs is not None and self._q_vecs.shape[0]:
+            sims = (self._q_vecs @ qvec.T).toarray().ravel()
+            best = int(np.argmax(sims))
+            if sims[best] > self._SEM_THRESHOLD and self._q_keys[best][1] == k:
+                near = self._query_cache.get(self._q_keys[best])
+                if near is not None:
+                    return [dict(r) for r in near]
+
+        # cosine-like via tfidf dot; kept sparse so work is O(nnz), never O(N) dense
+        prod = (self.tfidf @ qvec.T).tocsc()
+        data = prod.data
+        row_idx = prod.indices
         results = []
 
         # If TF-IDF yields no positive signals (all scores <= 0) use a cheap overlap heuristic
-        if np.all(scores <= 0):
-            # Token overlap scoring (simple, deterministic)
-            qtokens = [t for t in re.findall(r"\w+", query.lower()) if len(t) > 1]
-            def overlap_score(text: str) -> int:
-                tokens = [t for t in re.findall(r"\w+", text.lower()) if len(t) > 1]
-                c = Counter(tokens)
-                return sum(c[t] for t in qtokens)
-
-            scored = [(i, overlap_score(self.chunks[i].text)) for i in range(len(self.chunks))]
-            scored.sort(key=lambda x: (-x[1], x[0]))
-            for i, sc in scored[:k]:
+        if data.size == 0 or float(data.max()) <= 0.0:
+            # nothing alphanumeric to match: skip the corpus scan entirely
+            if not any(c.isalnum() for c in query):
+                self._remember(cache_key, qvec, [])
+                return []
+            self._ensure_token_arrays()
+            if self._tok_concat is not None and self._tok_concat.size:
+                # SoA scoring: one isin over the contiguous hashed-token array,
+                # then a segmented sum per chunk — no Python-level tokenization
+                q_hashes = _hash_tokens(query.lower())
+                hits = np.isin(self._tok_concat, q_hashes).astype(np.int32)
+                # sentinel zero keeps every offset a valid reduceat index, so
+                # a trailing zero-token chunk cannot truncate its neighbour's
+                # segment the way clamping into range would
+                hits = np.append(hits, np.int32(0))
+                ov = np.add.reduceat(hits, self._tok_offsets[:-1])
+                ov[self._tok_lens == 0] = 0  # reduceat misreports empty segments
+                scored = [(int(i), float(ov[i])) for i in np.lexsort((np.arange(ov.size), -ov))[:k]]
+            elif self._count_vec is not None:
+                # Vectorized: overlap is one sparse counts @ query-counts dot,
+                # with a deterministic (-score, index) tiebreak via lexsort.
+                qv = self._count_vec.transform([query])
+                ov = (self._counts @ qv.T).toarray().ravel()
+                scored = [(int(i), float(ov[i])) for i in np.lexsort((np.arange(ov.size), -ov))[:k]]
+            else:
+                # Token overlap scoring (simple, deterministic); query tokenized once
+                qtokens = [t for t in _WORD_RE.findall(query.lower()) if len(t) > 1]
+                if not qtokens:
+                    # stop-word-only query: nothing can score, skip the scan
+                    scored = []
+                else:
+                    def overlap_score(text: str) -> int:
+                        c = Counter(t for t in _WORD_RE.findall(text.lower()) if len(t) > 1)
+                        return sum(c[t] for t in qtokens)
+
+                    scored = [(i, overlap_score(self.chunks[i].text)) for i in range(len(self.chunks))]
+                    scored.sort(key=lambda x: (-x[1], x[0]))
+                    scored = scored[:k]
+            for i, sc in scored:
                 chunk = self.chunks[int(i)]
                 results.append(
                     {
@@ -114,28 +397,54 @@ class Retriever:
                         "source": chunk.source,
                         "idx": chunk.idx,
                         "text": chunk.text,
+                        "_lower": getattr(chunk, "text_lower", None) or chunk.text.lower(),
                         "score": float(sc),
                     }
                 )
+            self._remember(cache_key, qvec, results)
             return results
 
-        # Normal TF-IDF path: return top-k chunks with non-negative scores
-        added = 0
-        for idx in indices:
-            if added >= k:
-                break
-            sc = float(scores[idx])
-            chunk = self.chunks[int(idx)]
+        # Normal TF-IDF path: argpartition over the nonzero candidates only,
+        # then lexsort for a deterministic (-score, chunk index) ordering so
+        # equal scores never shuffle between runs.
+        kk = min(k, data.size)
+        cand = np.argpartition(-data, kk - 1)[:kk]
+        top = cand[np.lexsort((row_idx[cand], -data[cand]))]
+        for i in top:
+            chunk = self.chunks[int(row_idx[i])]
             results.append(
                 {
                     "chunk_id": chunk.chunk_id,
                     "source": chunk.source,
                     "idx": chunk.idx,
                     "text": chunk.text,
-                    "score": sc,
+                    "_lower": getattr(chunk, "text_lower", None) or chunk.text.lower(),
+                    "score": float(data[i]),
                 }
             )
-            added += 1
+        if len(results) < k:
+            # fewer than k chunks share a term with the query: pad with
+            # zero-score chunks in index order, matching both the baseline
+            # behaviour and retrieve_many's dense ranking (scores are
+            # non-negative, so zeros always sort last)
+            chosen = {int(row_idx[i]) for i in top}
+            for ci in range(len(self.chunks)):
+                if len(results) >= k:
+                    break
+                if ci in chosen:
+                    continue
+                chunk = self.chunks[ci]
+                results.append(
+                    {
+                        "chunk_id": chunk.chunk_id,
+                        "source": chunk.source,
+                        "idx": chunk.idx,
+                        "text": chunk.text,
+                        "_lower": getattr(chunk, "text_lower", None) or chunk.text.lower(),
+                        "score": 0.0,
+                    }
+                )
+        self._remember(cache_key, qvec, results)
         return results
 
 
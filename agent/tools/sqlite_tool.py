@@ -1,4 +1,5 @@
 ﻿# agent/tools/sqlite_tool.py
+import os
 import sqlite3
 from typing import Tuple, List, Dict, Any, Optional
 
@@ -8,14 +9,39 @@ class SQLiteTool:
     Compatible with DSPy + LangGraph HybridAgent for NL2SQL queries.
     """
 
-    def __init__(self, path: str):
+    def __init__(self, path: str, read_only: bool = True):
         self.path = path
+        self.read_only = read_only
         self.conn: Optional[sqlite3.Connection] = None
+        # introspection caches keyed by PRAGMA schema_version, which bumps on
+        # any DDL — reads stay cached until the schema actually changes
+        self._tables_cache: Optional[Tuple[int, List[str]]] = None
+        self._table_info_cache: Dict[Tuple[int, str], List[Dict[str, Any]]] = {}
 
     def connect(self):
         """Establish connection if not already connected."""
         if self.conn is None:
-            self.conn = sqlite3.connect(self.path)
+            # larger statement cache so repeated parameterized queries skip re-compilation;
+            # check_same_thread off because HybridAgent introspects from a worker thread
+            if self.read_only and os.path.exists(self.path):
+                # read-only URI connection: no write locks, and WAL readers
+                # never block each other on the agent's SELECT-only workload
+                self.conn = sqlite3.connect(
+                    f"file:{self.path}?mode=ro", uri=True,
+                    cached_statements=256, check_same_thread=False,
+                )
+            else:
+                self.conn = sqlite3.connect(self.path, cached_statements=256, check_same_thread=False)
+                try:
+                    # WAL + relaxed fsync only make sense when we can write
+                    self.conn.executescript("PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;")
+                except sqlite3.Error:
+                    pass
+            try:
+                # in-memory temp space and a 64 MiB page cache help both modes
+                self.conn.executescript("PRAGMA temp_store=MEMORY; PRAGMA cache_size=-65536;")
+            except sqlite3.Error:
+                pass
             self.conn.row_factory = sqlite3.Row  # fetch results as dict-like
 
     def close(self):
@@ -24,18 +50,30 @@ class SQLiteTool:
             self.conn.close()
             self.conn = None
 
+    def _schema_version(self) -> int:
+        return self.conn.execute("PRAGMA schema_version").fetchone()[0]
+
     def list_tables(self) -> List[str]:
         """Return list of tables in the database."""
         self.connect()
+        ver = self._schema_version()
+        if self._tables_cache is not None and self._tables_cache[0] == ver:
+            return list(self._tables_cache[1])
         cur = self.conn.execute("SELECT name FROM sqlite_master WHERE type='table' ORDER BY name;")
-        return [r[0] for r in cur.fetchall()]
+        tables = [r[0] for r in cur.fetchall()]
+        self._tables_cache = (ver, tables)
+        return list(tables)
 
     def pragma_table_info(self, table_name: str) -> List[Dict[str, Any]]:
         """Return PRAGMA table_info for schema introspection."""
         self.connect()
+        key = (self._schema_version(), table_name)
+        cached = self._table_info_cache.get(key)
+        if cached is not None:
+            return [dict(r) for r in cached]
         cur = self.conn.execute(f"PRAGMA table_info('{table_name}')")
         rows = cur.fetchall()
-        return [
+        info = [
             {
                 "cid": r["cid"],
                 "name": r["name"],
@@ -45,11 +83,16 @@ class SQLiteTool:
                 "pk": r["pk"]
             } for r in rows
         ]
+        self._table_info_cache[key] = info
+        return [dict(r) for r in info]
 
-    def execute(self, sql: str, params: Tuple = ()) -> Dict[str, Any]:
+    def execute(self, sql: str, params: Tuple = (), row_format: str = "records") -> Dict[str, Any]:
         """
         Execute SQL query or statement.
-        Returns a dict with keys: ok, error, columns, rows, rowcount
+        Returns a dict with keys: ok, error, columns, rows, rowcount.
+        With row_format="columnar" the result carries "data" (one list per
+        column) instead of "rows" — no per-row dict allocation for wide or
+        long result sets.
         """
         self.connect()
         try:
@@ -57,10 +100,15 @@ class SQLiteTool:
             # If SELECT statement
             if cur.description is not None:
                 columns = [c[0] for c in cur.description]
+                if row_format == "columnar":
+                    raw = cur.fetchall()
+                    data = [list(c) for c in zip(*raw)] if raw else [[] for _ in columns]
+                    return {"ok": True, "error": None, "columns": columns, "data": data, "rowcount": len(raw)}
                 rows = [dict(r) for r in cur.fetchall()]
                 return {"ok": True, "error": None, "columns": columns, "rows": rows, "rowcount": len(rows)}
             else:
-                self.conn.commit()
+                if not self.read_only:
+                    self.conn.commit()
                 return {"ok": True, "error": None, "columns": [], "rows": [], "rowcount": cur.rowcount}
         except Exception as e:
             return {"ok": False, "error": str(e), "columns": [], "rows": [], "rowcount": 0}
@@ -2,14 +2,51 @@
 db = "data/northwind.sqlite"
 if not os.path.exists(db):
     raise SystemExit("DB not found: " + db)
+
+def refresh_mv_order_items(conn):
+    # Materialized copy of "Order Details": a plain table dodges the view
+    # substitution step in the planner on every agent query. Rebuilt
+    # (drop + recreate) whenever the source row count no longer matches.
+    cur = conn.cursor()
+    src_rows = cur.execute('SELECT COUNT(*) FROM "Order Details"').fetchone()[0]
+    try:
+        mv_rows = cur.execute("SELECT COUNT(*) FROM mv_order_items").fetchone()[0]
+    except sqlite3.OperationalError:
+        mv_rows = -1
+    if mv_rows != src_rows:
+        cur.executescript("""
+DROP TABLE IF EXISTS mv_order_items;
+CREATE TABLE mv_order_items AS SELECT OrderID, ProductID, Quantity, UnitPrice, Discount FROM "Order Details";
+CREATE INDEX IF NOT EXISTS idx_mv_oi_oid ON mv_order_items(OrderID);
+ANALYZE mv_order_items;
+""")
+    conn.commit()
+
 conn = sqlite3.connect(db)
 cur = conn.cursor()
+# materialize first so the order_items view below can point at the table
+refresh_mv_order_items(conn)
 cur.executescript("""
 CREATE VIEW IF NOT EXISTS orders AS SELECT * FROM Orders;
-CREATE VIEW IF NOT EXISTS order_items AS SELECT * FROM "Order Details";
+-- order_items reads the materialized, indexed copy instead of the raw
+-- "Order Details" table, so queries through the view get the mv benefit
+DROP VIEW IF EXISTS order_items;
+CREATE VIEW order_items AS SELECT OrderID, ProductID, Quantity, UnitPrice, Discount FROM mv_order_items;
 CREATE VIEW IF NOT EXISTS products AS SELECT * FROM Products;
 CREATE VIEW IF NOT EXISTS customers AS SELECT * FROM Customers;
+
+-- supporting indexes for the agent's SELECT hot path: date range filters on
+-- Orders and joins on OrderID / CategoryID become index scans
+CREATE INDEX IF NOT EXISTS idx_orders_date ON Orders(OrderDate);
+CREATE INDEX IF NOT EXISTS idx_od_orderid ON "Order Details"(OrderID);
+CREATE INDEX IF NOT EXISTS idx_products_catid ON Products(CategoryID);
+-- covering index so SUM(UnitPrice * Quantity * (1 - Discount)) aggregations
+-- are served from the index without row lookups
+CREATE INDEX IF NOT EXISTS idx_od_covering ON "Order Details"(OrderID, ProductID, Quantity, UnitPrice, Discount);
+
+-- refresh the planner statistics so the new indexes are actually picked
+ANALYZE;
 """)
 conn.commit()
 conn.close()
-print("Views created successfully in", db)
+print("Views and indexes created successfully in", db)
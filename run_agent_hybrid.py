@@ -1,56 +1,101 @@
 ﻿# run_agent_hybrid.py
-import json
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from agent.graph_hybrid import HybridAgent
 
-def run(batch_file: str, out_file: str):
+# orjson (C extension) when available; stdlib json otherwise
+try:
+    import orjson
+
+    def _loads(s):
+        return orjson.loads(s)
+
+    def _dumps(obj) -> str:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    _JSONDecodeError = orjson.JSONDecodeError
+except ImportError:
+    import json
+
+    _loads = json.loads
+
+    def _dumps(obj) -> str:
+        return json.dumps(obj, ensure_ascii=False)
+
+    _JSONDecodeError = json.JSONDecodeError
+
+def run(batch_file: str, out_file: str, workers: int = 1):
     agent = HybridAgent()
-    results = []
 
-    # BOM-safe and streaming read
+    # BOM-safe read; pre-parse all questions so retrieval can be batched
+    items = []
     with open(batch_file, "r", encoding="utf-8-sig") as f:
         for line_num, line in enumerate(f, start=1):
             line = line.strip()
             if not line:
                 continue
             try:
-                item = json.loads(line)
-            except json.JSONDecodeError as e:
+                item = _loads(line)
+            except _JSONDecodeError as e:
                 print(f"Error parsing JSON on line {line_num}: {e}")
                 continue
+            items.append((
+                item.get("id", f"line{line_num}"),
+                item.get("question", ""),
+                item.get("format_hint", ""),
+            ))
 
-            qid = item.get("id", f"line{line_num}")
-            question = item.get("question", "")
-            format_hint = item.get("format_hint", "")
-            print(f"Processing {qid} ...")
-            try:
-                res = agent.answer(qid, question, format_hint)
-                results.append(res)
-            except Exception as e:
-                print(f"Error processing question {qid}: {e}")
-                results.append({
-                    "id": qid,
-                    "final_answer": None,
-                    "sql": "",
-                    "confidence": 0.0,
-                    "explanation": str(e),
-                    "citations": [],
-                })
-
-    # Write results to JSONL
+    # Warm the retrieval cache with one batched transform + matmul; each
+    # agent.answer call below then hits the query cache instead of
+    # re-vectorizing its question.
+    try:
+        agent.retriever.retrieve_many([q for _, q, _ in items], k=5)
+    except Exception:
+        pass
+
+    def _answer(item):
+        qid, question, format_hint = item
+        print(f"Processing {qid} ...")
+        try:
+            return agent.answer(qid, question, format_hint)
+        except Exception as e:
+            print(f"Error processing question {qid}: {e}")
+            return {
+                "id": qid,
+                "final_answer": None,
+                "sql": "",
+                "confidence": 0.0,
+                "explanation": str(e),
+                "citations": [],
+            }
+
+    # Stream results to JSONL as they are produced: constant memory, and a
+    # crash mid-batch keeps everything answered so far. With --workers > 1
+    # the questions are answered on a thread pool (SQLite reads and sparse
+    # matmuls release the GIL); ex.map keeps the output in input order.
+    written = 0
     with open(out_file, "w", encoding="utf-8") as f:
-        for r in results:
-            f.write(json.dumps(r, ensure_ascii=False) + "\n")
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as ex:
+                for res in ex.map(_answer, items):
+                    f.write(_dumps(res) + "\n")
+                    written += 1
+        else:
+            for item in items:
+                f.write(_dumps(_answer(item)) + "\n")
+                written += 1
 
-    print(f"Wrote {len(results)} results to {out_file}")
+    print(f"Wrote {written} results to {out_file}")
 
 
 def main():
     parser = argparse.ArgumentParser(description="Run Retail Analytics HybridAgent on JSONL batch")
     parser.add_argument("--batch", required=True, help="Input JSONL file with questions")
     parser.add_argument("--out", required=True, help="Output JSONL file for results")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Thread pool size for answering questions (default 1: sequential, fully reproducible)")
     args = parser.parse_args()
-    run(args.batch, args.out)
+    run(args.batch, args.out, workers=args.workers)
 
 
 if __name__ == "__main__":
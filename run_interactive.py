@@ -4,18 +4,101 @@
 Usage examples (PowerShell):
   python run_interactive.py
   python run_interactive.py --out outputs_hybrid.jsonl
+  python run_interactive.py --async
 
 Type a blank question to exit. If --out is provided, each result is appended as a JSONL line.
+With --async (requires prompt_toolkit) the index build and DB connect happen in the
+background while you type the first question.
 """
 import argparse
+import atexit
 import json
 from agent.graph_hybrid import HybridAgent
 
+# orjson (C extension) for the per-answer JSONL append when available;
+# console pretty-printing and trace reading stay on stdlib json
+try:
+    import orjson
+
+    def _dumps(obj) -> str:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+except ImportError:
+    def _dumps(obj) -> str:
+        return json.dumps(obj, ensure_ascii=False)
+
+
+def _answer(agent: HybridAgent, qid: str, q: str, fmt: str) -> dict:
+    try:
+        return agent.answer(qid, q, fmt)
+    except Exception as e:
+        return {
+            "id": qid,
+            "final_answer": None,
+            "sql": "",
+            "confidence": 0.0,
+            "explanation": str(e),
+            "citations": [],
+        }
+
+
+def _report(res: dict, qid: str) -> None:
+    # Pretty-print to console
+    print("Result:")
+    print(json.dumps(res, ensure_ascii=False, indent=2))
+
+    # Also show trace summary (route / plan / sql) when available
+    trace_path = f"logs/trace_{qid}.ndjson"
+    try:
+        # one JSON event per line (NDJSON)
+        with open(trace_path, "r", encoding="utf-8") as tf:
+            trace = [json.loads(line) for line in tf if line.strip()]
+        # Extract simple events
+        route = None
+        plan = None
+        sql = None
+        for e in trace:
+            if e.get("event") == "route":
+                route = e.get("route")
+            if e.get("event") == "plan":
+                plan = e.get("plan")
+            if e.get("event") == "nl2sql_generate":
+                sql = e.get("sql")
+        print("Trace summary:")
+        print(f"  route: {route}")
+        print(f"  plan: {plan}")
+        print(f"  sql: {sql}")
+    except Exception:
+        pass
+
+
+def _open_out(out_file: str | None):
+    # open the output once: one handle for the whole session instead of an
+    # open/close syscall pair per answer; flushed after each write
+    if not out_file:
+        return None
+    out_f = open(out_file, "a", encoding="utf-8")
+    atexit.register(out_f.close)
+    return out_f
+
+
+def _warmup(agent: HybridAgent) -> None:
+    # cold-start work (TF-IDF index build, SQLite connect) done eagerly so the
+    # first question does not pay for it
+    try:
+        agent.retriever.build_index()
+    except Exception:
+        pass
+    try:
+        agent.sqlite.connect()
+    except Exception:
+        pass
+
 
 def interactive(out_file: str | None = None) -> None:
     agent = HybridAgent()
     idx = 1
-    results = []
+    written = 0
+    out_f = _open_out(out_file)
     print("Interactive Retail Analytics tester. Enter an empty question to exit.")
     while True:
         try:
@@ -27,61 +110,73 @@ def interactive(out_file: str | None = None) -> None:
             break
         fmt = input(" format_hint (optional): ").strip()
         qid = f"interactive_{idx}"
-        try:
-            res = agent.answer(qid, q, fmt)
-        except Exception as e:
-            res = {
-                "id": qid,
-                "final_answer": None,
-                "sql": "",
-                "confidence": 0.0,
-                "explanation": str(e),
-                "citations": [],
-            }
-
-        # Pretty-print to console
-        print("Result:")
-        print(json.dumps(res, ensure_ascii=False, indent=2))
-
-        # Also show trace summary (route / plan / sql) when available
-        trace_path = f"logs/trace_{qid}.json"
-        try:
-            with open(trace_path, "r", encoding="utf-8") as tf:
-                trace = json.load(tf)
-            # Extract simple events
-            route = None
-            plan = None
-            sql = None
-            for e in trace:
-                if e.get("event") == "route":
-                    route = e.get("route")
-                if e.get("event") == "plan":
-                    plan = e.get("plan")
-                if e.get("event") == "nl2sql_generate":
-                    sql = e.get("sql")
-            print("Trace summary:")
-            print(f"  route: {route}")
-            print(f"  plan: {plan}")
-            print(f"  sql: {sql}")
-        except Exception:
-            pass
+        res = _answer(agent, qid, q, fmt)
+        _report(res, qid)
 
         # Optionally append to JSONL
-        if out_file:
-            with open(out_file, "a", encoding="utf-8") as f:
-                f.write(json.dumps(res, ensure_ascii=False) + "\n")
+        if out_f:
+            out_f.write(_dumps(res) + "\n")
+            out_f.flush()
+            written += 1
 
-        results.append(res)
         idx += 1
 
     if out_file:
-        print(f"Wrote {len(results)} results to {out_file}")
+        print(f"Wrote {written} results to {out_file}")
+
+
+async def interactive_async(out_file: str | None = None) -> None:
+    # prompt_toolkit variant: the agent warms up on an executor thread while
+    # the user types the first question, hiding cold-start latency
+    import asyncio
+    from prompt_toolkit import PromptSession
+
+    agent = HybridAgent()
+    warm = asyncio.get_running_loop().run_in_executor(None, _warmup, agent)
+    session = PromptSession()
+    idx = 1
+    written = 0
+    out_f = _open_out(out_file)
+    print("Interactive Retail Analytics tester. Enter an empty question to exit.")
+    while True:
+        try:
+            q = (await session.prompt_async(f"[{idx}] question: ")).strip()
+        except (EOFError, KeyboardInterrupt):
+            print()
+            break
+        if not q:
+            break
+        fmt = (await session.prompt_async(" format_hint (optional): ")).strip()
+        await warm  # no-op after the first question
+        qid = f"interactive_{idx}"
+        res = _answer(agent, qid, q, fmt)
+        _report(res, qid)
+
+        if out_f:
+            out_f.write(_dumps(res) + "\n")
+            out_f.flush()
+            written += 1
+
+        idx += 1
+
+    if out_file:
+        print(f"Wrote {written} results to {out_file}")
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Interactive tester for Retail Analytics HybridAgent")
     parser.add_argument("--out", help="Optional JSONL file to append results to")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="Use prompt_toolkit async prompting with background warmup")
     args = parser.parse_args()
+    if args.use_async:
+        try:
+            import asyncio
+            import prompt_toolkit  # noqa: F401
+            asyncio.run(interactive_async(args.out))
+            return
+        except ImportError:
+            print("prompt_toolkit not installed; falling back to the standard prompt.")
     interactive(args.out)
 
 
@@ -4,25 +4,19 @@ from agent.tools.sqlite_tool import SQLiteTool
 
 tool = SQLiteTool(r'C:\Users\lenovo\retail-analytics-copilot\data\Northwind.sqlite')
 
-# Test Q2: Top category by quantity in summer 2013
-sql = """SELECT c.CategoryName as category, SUM(od.Quantity) as quantity FROM [Order Details] od JOIN Orders o ON o.OrderID = od.OrderID JOIN Products p ON p.ProductID = od.ProductID JOIN Categories c ON c.CategoryID = p.CategoryID WHERE o.OrderDate BETWEEN '2013-06-01' AND '2013-06-30' GROUP BY c.CategoryID ORDER BY quantity DESC LIMIT 1;"""
+# One round trip: each former standalone query becomes a scalar subquery, so
+# the planner and B-tree page cache stay warm across all three.
+sql = """SELECT
+  (SELECT c.CategoryName FROM [Order Details] od JOIN Orders o ON o.OrderID = od.OrderID JOIN Products p ON p.ProductID = od.ProductID JOIN Categories c ON c.CategoryID = p.CategoryID WHERE o.OrderDate BETWEEN '2013-06-01' AND '2013-06-30' GROUP BY c.CategoryID ORDER BY SUM(od.Quantity) DESC LIMIT 1) AS top_category,
+  (SELECT ROUND(SUM(od.UnitPrice * od.Quantity * (1 - od.Discount)) * 1.0 / NULLIF(COUNT(DISTINCT o.OrderID), 0), 2) FROM [Order Details] od JOIN Orders o ON o.OrderID = od.OrderID WHERE o.OrderDate BETWEEN '2017-12-01' AND '2017-12-31') AS aov,
+  (SELECT ROUND(SUM(od.UnitPrice * od.Quantity * (1 - od.Discount)), 2) FROM [Order Details] od JOIN Orders o ON o.OrderID = od.OrderID JOIN Products p ON p.ProductID = od.ProductID JOIN Categories c ON c.CategoryID = p.CategoryID WHERE c.CategoryName = 'Beverages' AND o.OrderDate BETWEEN '2013-06-01' AND '2013-06-30') AS beverage_revenue;"""
 
 print("Testing SQL:", sql)
 result = tool.execute(sql)
 print("Result:", result)
-print()
-
-# Test Q3: AOV in winter 2017
-sql2 = """SELECT ROUND(SUM(od.UnitPrice * od.Quantity * (1 - od.Discount)) * 1.0 / NULLIF(COUNT(DISTINCT o.OrderID), 0), 2) as aov FROM [Order Details] od JOIN Orders o ON o.OrderID = od.OrderID WHERE o.OrderDate BETWEEN '2017-12-01' AND '2017-12-31';"""
-
-print("Testing SQL:", sql2)
-result2 = tool.execute(sql2)
-print("Result:", result2)
-print()
-
-# Test Q5: Beverages revenue in summer 2013
-sql3 = """SELECT ROUND(SUM(od.UnitPrice * od.Quantity * (1 - od.Discount)), 2) as revenue FROM [Order Details] od JOIN Orders o ON o.OrderID = od.OrderID JOIN Products p ON p.ProductID = od.ProductID JOIN Categories c ON c.CategoryID = p.CategoryID WHERE c.CategoryName = 'Beverages' AND o.OrderDate BETWEEN '2013-06-01' AND '2013-06-30';"""
-
-print("Testing SQL:", sql3)
-result3 = tool.execute(sql3)
-print("Result:", result3)
+if result["ok"] and result["rows"]:
+    row = result["rows"][0]
+    print()
+    print("Q2 top category (summer 2013):", row["top_category"])
+    print("Q3 AOV (winter 2017):", row["aov"])
+    print("Q5 Beverages revenue (summer 2013):", row["beverage_revenue"])